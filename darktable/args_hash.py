@@ -16,9 +16,9 @@ def args_hash(*args, **kw):
     arguments, this function will produce the same
     hash key.
     """
-    items = list(args) + [i for t in sorted(kw.items()) for i in t]
-    items = ('__NoneType__' if _i is None else _i
-             for _i in items)
     # All items must be strings
-    args_string = '|'.join(items)
-    return hashlib.sha1(_tob(args_string)).hexdigest()
+    sha1 = hashlib.sha1()
+    for item in (*args, *(i for t in sorted(kw.items()) for i in t)):
+        sha1.update(_tob('__NoneType__' if item is None else item))
+        sha1.update(b'|')
+    return sha1.hexdigest()
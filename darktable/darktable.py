@@ -1,14 +1,14 @@
 import re
 import os
+import json
 import subprocess
 import tempfile
 import datetime
 import sqlite3
-import string
-import dateutil.parser
 from enum import Enum
-from pathlib import Path, PurePosixPath
+from pathlib import PurePosixPath
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 from io import TextIOWrapper
@@ -18,18 +18,24 @@ from PIL import Image
 
 import exif
 
-from darktable.util import Cache, filehash, readonly_sqlite_connection, fullname
+from darktable.util import Cache, cache_save_many, filehash, readonly_sqlite_connection, fullname
 from darktable.args_hash import args_hash
 
 
 MODULE_DIR = path.abspath(path.dirname(__file__))
-CACHE_FILENAME = os.path.splitext(__file__)[0] + '.cache.pkl'
+CACHE_FILENAME = os.path.splitext(__file__)[0] + '.cache.db'
+
+_RE_FORMAT_OPTIONS = re.compile(r'[,;\s]')
+_RE_PLACEHOLDER = re.compile(r'\{([A-Z\.]+)\}')
+_RE_EXPORT_FILE = re.compile(r'exported to `([^\']+)\'')
 
 
 Position = int
 
 
 class HasId:
+    __slots__ = ('id',)
+
     id: int
 
     def __hash__(self):
@@ -40,6 +46,8 @@ class HasId:
 
 
 class FilmRoll(HasId):
+    __slots__ = ('directory',)
+
     def __init__(self, id, directory):
         self.id = id
         self.directory = directory
@@ -49,6 +57,8 @@ class FilmRoll(HasId):
 
 
 class Tag(HasId):
+    __slots__ = ('name',)
+
     def __init__(self, id, name):
         self.id = id
         self.name = name
@@ -66,7 +76,16 @@ class ColorLabel(Enum):
     PURPLE = 4
 
 
+# plain dict lookup is much cheaper than Enum.__call__
+# when materializing labels for every photo row
+_COLOR_LABELS = {label.value: label for label in ColorLabel}
+
+
 class Photo(HasId):
+    __slots__ = ('filepath', 'version', 'datetime_taken', 'tags',
+                 'film_roll', 'position', 'rating', 'color_labels',
+                 'xmp_path')
+
     def __init__(self, id, filepath, version, datetime_taken: datetime.datetime,
                  tags: dict[Tag, Position], film_roll: FilmRoll, position: Position,
                  rating: int, color_labels: set[ColorLabel]):
@@ -79,15 +98,13 @@ class Photo(HasId):
         self.position: Position = position
         self.rating: int = rating
         self.color_labels: set[ColorLabel] = color_labels
-
-    @property
-    def xmp_path(self):
-        filename = path.basename(self.filepath)
-        filename, ext = path.splitext(filename)
+        # computed once here instead of on every access,
+        # filepath is normalized above and never changes
+        filename, ext = path.splitext(path.basename(self.filepath))
         if self.version > 0:
             filename += '_' + f'{self.version:02}'
-        xmp_path = filename + ext + '.' + 'xmp'
-        return path.join(path.dirname(self.filepath), xmp_path)
+        self.xmp_path: str = path.join(
+            path.dirname(self.filepath), filename + ext + '.' + 'xmp')
 
     def __repr__(self):
         return self.__class__.__name__ + '(' + \
@@ -102,11 +119,32 @@ class Photo(HasId):
             ]) + ')'
 
 
+def _remove_jpeg_metadata(data: bytes) -> bytes:
+    """ Removes all APP1 (EXIF and XMP) metadata segments from JPEG data
+        without decoding or re-encoding the image itself.
+    """
+    out = bytearray(data[:2])  # start-of-image marker
+    pos = 2
+    while pos + 4 <= len(data):
+        marker = data[pos:pos+2]
+        size = int.from_bytes(data[pos+2:pos+4], 'big')
+        end = pos + 2 + size
+        if marker[1] != 0xE1:  # drop APP1, keep everything else
+            out += data[pos:end]
+        if marker == b'\xff\xda':  # start of scan, the rest is image data
+            out += data[end:]
+            break
+        pos = end
+    return bytes(out)
+
+
 def parse_format_options(options_list: str):
-    return list(filter(None, re.split(r'[,;\s]', options_list)))
+    return list(filter(None, _RE_FORMAT_OPTIONS.split(options_list)))
 
 
 class Export:
+    __slots__ = ('photo', '_filepath', '_width', '_height')
+
     def __init__(self, photo: Photo, filepath: str):
         self.photo: Photo = photo
         self.filepath: str = filepath
@@ -182,9 +220,8 @@ class FilenameFormat:
 
     def render(self, **kwargs):
         format_dict = FilenameFormat.Default(kwargs)
-        result = string.Formatter().vformat(self.format_string, (), format_dict)
-        # result = self.format_string.format_map(format_dict)
-        result = re.sub(r'\{([A-Z\.]+)\}', r'$(\1)', result)
+        result = self.format_string.format_map(format_dict)
+        result = _RE_PLACEHOLDER.sub(r'$(\1)', result)
         return result
 
 
@@ -206,8 +243,7 @@ class Exporter:
         self.exif_copyright = exif_copyright
         self.debug = debug
         self.xmp_changes = xmp_changes
-        fd, self.tmp_xmp_name = tempfile.mkstemp(suffix='.xmp')
-        os.close(fd)
+        self._tmp_xmp_name = None
 
         self.args_hash = args_hash(
             cli_bin=str(cli_bin),
@@ -223,6 +259,9 @@ class Exporter:
         self.cache = Cache(path.join(MODULE_DIR, CACHE_FILENAME), prefix=f'{cache_key}:main:')
         self.cache_xmp_hashes = Cache(path.join(MODULE_DIR, CACHE_FILENAME), prefix=f'{cache_key}:xmp:')
         self.cache_exported = Cache(path.join(MODULE_DIR, CACHE_FILENAME), prefix=f'{cache_key}:export:')
+        # file digests depend on file contents only,
+        # so they are shared between exporter configurations
+        self.cache_file_hashes = Cache(path.join(MODULE_DIR, CACHE_FILENAME), prefix='filehash:')
         if self.args_hash != self.cache.load('args_hash'):
             self.cache_exported.prune()
             self.cache_xmp_hashes.prune()
@@ -230,8 +269,24 @@ class Exporter:
 
         self._sess_exported = set()
 
+    @property
+    def tmp_xmp_name(self):
+        # created lazily so every process exporting photos
+        # gets its own temporary xmp file
+        if self._tmp_xmp_name is None:
+            fd, self._tmp_xmp_name = tempfile.mkstemp(suffix='.xmp')
+            os.close(fd)
+        return self._tmp_xmp_name
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # worker processes must not share the parent's temporary xmp file
+        state['_tmp_xmp_name'] = None
+        return state
+
     def __del__(self):
-        os.unlink(self.tmp_xmp_name)
+        if self._tmp_xmp_name is not None:
+            os.unlink(self._tmp_xmp_name)
 
     def export_cached(self, photo: Photo, out_dir: str) -> Export:
         """ Exports a photo to a directory through Darktable's CLI interface,
@@ -243,7 +298,7 @@ class Exporter:
         # TODO hash the class instead and return this identifier
         cache_key = f'{photo.filepath}:{photo.version}'
 
-        xmp_hash = filehash(photo.xmp_path)
+        xmp_hash = filehash(photo.xmp_path, self.cache_file_hashes)
         export_filepath = self.cache_exported.load(cache_key)
         if export_filepath is not None and path.exists(export_filepath):
             self._sess_exported.add(export_filepath)
@@ -252,11 +307,57 @@ class Exporter:
 
         export = self.export(photo, out_dir=out_dir)
 
-        self.cache_xmp_hashes.save(cache_key, xmp_hash)
-        self.cache_exported.save(cache_key, export.filepath)
+        # both writes share one transaction, i.e. one disk flush
+        cache_save_many([
+            (self.cache_xmp_hashes, cache_key, xmp_hash),
+            (self.cache_exported, cache_key, export.filepath),
+        ])
 
         return export
 
+    def export_many(self, photos: list[Photo], out_dir: str, workers: int = None) -> list[Export]:
+        """ Exports multiple photos to a directory in parallel,
+            with the same caching behaviour as export_cached().
+            Returns the exports in the same order as the given photos.
+            The worker count defaults to half the cpu cores so the
+            workers don't oversubscribe darktable-cli's own threads.
+        """
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        exports: dict[int, Export] = {}
+        cache_keys: dict[int, tuple[str, str]] = {}
+        pending: list[tuple[int, Photo]] = []
+        for index, photo in enumerate(photos):
+            cache_key = f'{photo.filepath}:{photo.version}'
+            xmp_hash = filehash(photo.xmp_path, self.cache_file_hashes)
+            cache_keys[index] = (cache_key, xmp_hash)
+            export_filepath = self.cache_exported.load(cache_key)
+            if export_filepath is not None and path.exists(export_filepath):
+                self._sess_exported.add(export_filepath)
+                if xmp_hash == self.cache_xmp_hashes.load(cache_key):
+                    exports[index] = Export(photo, filepath=export_filepath)
+                    continue
+            pending.append((index, photo))
+        if len(pending) > 0:
+            # the workers only run darktable-cli and the exif rewrite;
+            # all cache writes stay in this process
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(self.export, photo, out_dir): index
+                    for index, photo in pending
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    export = future.result()
+                    cache_key, xmp_hash = cache_keys[index]
+                    self._sess_exported.add(export.filepath)
+                    cache_save_many([
+                        (self.cache_xmp_hashes, cache_key, xmp_hash),
+                        (self.cache_exported, cache_key, export.filepath),
+                    ])
+                    exports[index] = export
+        return [exports[index] for index in range(len(photos))]
+
     def export(self, photo: Photo, out_dir: str) -> Export:
         """ Exports a photo to a directory through Darktable's CLI interface.
             Returns a copy of the photo instance where export_filepath is set.
@@ -301,28 +402,21 @@ class Exporter:
             print(result.stdout.rstrip())
 
         # extract the exported filename
-        match = re.search(r'exported to `([^\']+)\'', result.stdout)
+        match = _RE_EXPORT_FILE.search(result.stdout)
         if not match:
             raise RuntimeError('expected darktable-cli output to contain filename')
 
         export_filepath = match.groups()[0]
         self._sess_exported.add(export_filepath)
 
-        # save personal details in exif
+        # read the exported image once, strip its metadata in memory
+        # and write it back with only the personal details set
         with open(export_filepath, 'rb') as image_file:
-            original_exif_image = exif.Image(image_file)
-
-        # remove exif data
-        image = Image.open(export_filepath)
-        data = list(image.getdata())
-        image_noexif = Image.new(image.mode, image.size)
-        image_noexif.putdata(data)
-        image_noexif.save(export_filepath)
-        image_noexif.close()
+            image_data = image_file.read()
+        original_exif_image = exif.Image(image_data)
+        exif_image = exif.Image(_remove_jpeg_metadata(image_data))
 
         # save personal details in exif
-        with open(export_filepath, 'rb') as image_file:
-            exif_image = exif.Image(image_file)
         if self.exif_artist is not None:
             exif_image.set('artist', self.exif_artist)
         if self.exif_copyright is not None:
@@ -340,55 +434,57 @@ class Exporter:
             The current session starts at object creation
             and is reset (cleared) whenever sync() is called.
         """
-        for filepath_obj in Path(directory).glob('**/*'):
-            filepath = str(filepath_obj)
-            if filepath_obj.is_file() and filepath not in self._sess_exported:
-                if not is_raw_photo_ext(path.splitext(filepath)[1]):
-                    # Remove all data associated with the photo from the cache
-                    # and delete the exported photo from the directory.
-                    for cache_key in self.cache_exported.keys(has_value=filepath):
-                        print(f'Removed from portfolio: {cache_key}')
-                        self.cache_exported.delete(cache_key)
-                        self.cache_xmp_hashes.delete(cache_key)
-                    try:
-                        os.remove(filepath)
-                    except Exception:
-                        pass
+        # map exported filepaths back to their cache keys once,
+        # instead of scanning the whole cache for every file on disk
+        exported_keys = defaultdict(list)
+        for cache_key, filepath in self.cache_exported.items():
+            exported_keys[filepath].append(cache_key)
+
+        # walk with scandir, which detects regular files from the
+        # directory entries without an extra stat call per file
+        stack = [str(directory)]
+        while len(stack) > 0:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                # nothing to clean up in a directory that doesn't
+                # exist (yet), e.g. on the very first export run
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    filepath = entry.path
+                    if entry.is_file(follow_symlinks=False) and filepath not in self._sess_exported:
+                        if not is_raw_photo_ext(path.splitext(filepath)[1]):
+                            # Remove all data associated with the photo from the cache
+                            # and delete the exported photo from the directory.
+                            for cache_key in exported_keys.get(filepath, []):
+                                print(f'Removed from portfolio: {cache_key}')
+                                self.cache_exported.delete(cache_key)
+                                self.cache_xmp_hashes.delete(cache_key)
+                            try:
+                                os.remove(filepath)
+                            except Exception:
+                                pass
 
         self._sess_exported.clear()
 
 
+# seconds between darktable's datetime origin (0001-01-01)
+# and epoch time (1970-01-01)
+_EPOCH_DELTA_SECONDS = 62135596800
+
+
 def parse_darktable_datetime(datetime_taken: int):
     # the timestamp is in microseconds
     # additionally, it uses an origin different than epoch time
     # https://github.com/darktable-org/darktable/blob/0f5bd178/src/common/datetime.c#L22C29-L22C52
-    origin = dateutil.parser.isoparse('0001-01-01 00:00:00.000Z')
-    epoch = dateutil.parser.isoparse('1970-01-01 00:00:00.000Z')
-    epoch_delta = epoch - origin
-    value = datetime_taken/1000/1000
-    value = max(value, epoch_delta.total_seconds())
-    value_corrected = value - epoch_delta.total_seconds()
+    value_corrected = max(datetime_taken/1000/1000 - _EPOCH_DELTA_SECONDS, 0)
     return datetime.datetime.fromtimestamp(value_corrected, datetime.timezone.utc)
 
 
-class AttachedDatabase:
-    def __init__(self, cursor: sqlite3.Cursor, name, db_path):
-        self.cursor = cursor
-        self.name = name
-        self.db_path = db_path
-        self.cursor.execute("""--sql
-            ATTACH DATABASE ? AS ?;
-        """, (self.db_path, self.name))
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *args):
-        self.cursor.execute("""--sql
-            DETACH ?;
-        """, (self.name,))
-
-
 class DarktableLibrary:
     DATA_DB = 'data.db'
     LIBRARY_DB = 'library.db'
@@ -399,6 +495,19 @@ class DarktableLibrary:
         self.library_dbpath = path.join(config_dir, self.LIBRARY_DB)
         self.data_conn = readonly_sqlite_connection(self.data_dbpath)
         self.library_conn = readonly_sqlite_connection(self.library_dbpath)
+        # keep data.db attached for the lifetime of the connection
+        # instead of re-attaching it for every photo query
+        self.library_conn.execute("""--sql
+            ATTACH DATABASE ? AS data;
+        """, (self.data_dbpath,))
+        self.library_conn.executescript("""--sql
+            PRAGMA cache_size = -65536;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA temp_store = MEMORY;
+        """)
+        # tags repeat across most photos of a library, so share one
+        # Tag instance per tag id instead of allocating one per row
+        self._tags: dict[int, Tag] = {}
 
     def __enter__(self):
         return self
@@ -413,7 +522,13 @@ class DarktableLibrary:
         self.data_conn.close()
         self.library_conn.close()
 
-    def _row_to_photo(self, row: sqlite3.Row, separator: str) -> Photo:
+    def _tag(self, tag_id: int, tag_name: str) -> Tag:
+        tag = self._tags.get(tag_id)
+        if tag is None:
+            tag = self._tags[tag_id] = Tag(tag_id, tag_name)
+        return tag
+
+    def _row_to_photo(self, row: sqlite3.Row) -> Photo:
         return Photo(
             id=int(row['id']),
             filepath=row['filepath'],
@@ -423,58 +538,56 @@ class DarktableLibrary:
                 if isinstance(row['datetime_taken'], int)
                 else 0),
             tags={
-                Tag(int(tag_id), tag_name): int(tag_position)
-                for tag_id, tag_name, tag_position in zip(
-                    row['tag_ids'].split(separator),
-                    row['tag_names'].split(separator),
-                    row['tag_positions'].split(separator)
-                )
+                self._tag(tag_id, tag_name): tag_position
+                for tag_id, tag_name, tag_position
+                in json.loads(row['tags'])
             },
             film_roll=FilmRoll(int(row['film_id']), row['film_directory']),
             position=int(row['film_position']),
             rating=row['rating'],
             color_labels=set(
-                ColorLabel(int(color_label))
-                for color_label in row['color_label'].split(separator)
-            ) if row['color_label'] is not None else set(),
+                _COLOR_LABELS[color_label]
+                for color_label in json.loads(row['color_labels'])
+                if color_label is not None
+            ),
         )
 
     def _select_photos(self, where_clause: str = "", args: tuple = (), limit: int = None) -> list[Photo]:
         cur = self.library_conn.cursor()
-        separator = '#~~~#'
         # extracting ratings from image flags with mask 0x7:
         # https://github.com/darktable-org/darktable/blob/0f5bd178/src/common/ratings.c#L52
         # https://github.com/darktable-org/darktable/blob/0f5bd178/src/common/ratings.h#L26
-        with AttachedDatabase(cur, 'data', self.data_dbpath):
-            cur.execute(f"""--sql
-                SELECT
-                    images.id,
-                    rtrim(film_rolls.folder, '/') || '/' || images.filename AS filepath,
-                    images.version,
-                    images.datetime_taken,
-                    images.flags & 0x7 as rating,
-                    film_rolls.id AS film_id,
-                    film_rolls.folder AS film_directory,
-                    images.position AS film_position,
-                    GROUP_CONCAT(_tagged_images_2.tagid, ?) AS tag_ids,
-                    GROUP_CONCAT(data.tags.name, ?) AS tag_names,
-                    GROUP_CONCAT(_tagged_images_2.position, ?) AS tag_positions,
-                    GROUP_CONCAT(color_labels.color, ?) as color_label
-                FROM tagged_images
-                INNER JOIN images ON tagged_images.imgid = images.id
-                INNER JOIN film_rolls ON film_rolls.id = images.film_id
-                INNER JOIN tagged_images _tagged_images_2 ON images.id = _tagged_images_2.imgid
-                INNER JOIN data.tags ON _tagged_images_2.tagid = data.tags.id
-                LEFT JOIN color_labels ON images.id = color_labels.imgid
-                {where_clause}
-                GROUP BY images.id
-                {f'LIMIT {limit}' if limit is not None and limit >= 0 else ''}
-            """, (separator, separator, separator, separator) + args)
-            result = cur.fetchall()
-            return [
-                self._row_to_photo(row, separator=separator)
-                for row in result
-            ]
+        cur.execute(f"""--sql
+            SELECT
+                images.id,
+                rtrim(film_rolls.folder, '/') || '/' || images.filename AS filepath,
+                images.version,
+                images.datetime_taken,
+                images.flags & 0x7 as rating,
+                film_rolls.id AS film_id,
+                film_rolls.folder AS film_directory,
+                images.position AS film_position,
+                json_group_array(json_array(
+                    _tagged_images_2.tagid,
+                    data.tags.name,
+                    _tagged_images_2.position
+                )) AS tags,
+                json_group_array(color_labels.color) AS color_labels
+            FROM tagged_images
+            INNER JOIN images ON tagged_images.imgid = images.id
+            INNER JOIN film_rolls ON film_rolls.id = images.film_id
+            INNER JOIN tagged_images _tagged_images_2 ON images.id = _tagged_images_2.imgid
+            INNER JOIN data.tags ON _tagged_images_2.tagid = data.tags.id
+            LEFT JOIN color_labels ON images.id = color_labels.imgid
+            {where_clause}
+            GROUP BY images.id
+            {f'LIMIT {limit}' if limit is not None and limit >= 0 else ''}
+        """, args)
+        result = cur.fetchall()
+        return [
+            self._row_to_photo(row)
+            for row in result
+        ]
 
     def get_photos(self) -> list[Photo]:
         return self._select_photos()
@@ -523,20 +636,36 @@ class DarktableLibrary:
             if that photo is tagged "foo|bar" in Darktable.
         """
         result = defaultdict(list)
-        for tag in self.get_subtags(tag_name):
-            for photo in self.get_tagged_photos(tag):
-                result[tag].append(photo)
+        subtags = {tag.id: tag for tag in self.get_subtags(tag_name)}
+        if len(subtags) == 0:
+            return result
+        # one query for all subtags instead of one query per subtag.
+        # each photo carries its full tag dict, so it can be grouped
+        # under its matching subtags in a single pass.
+        photos = self._select_photos(f"""--sql
+            WHERE tagged_images.tagid IN ({','.join('?' * len(subtags))})
+                AND LOWER(data.tags.name) NOT LIKE 'darktable%'
+        """, tuple(subtags.keys()))
+        for photo in photos:
+            for tag in photo.tags:
+                if tag.id in subtags:
+                    result[subtags[tag.id]].append(photo)
         return result
 
 
 def modify_xmp(in_filename, out_fd: TextIOWrapper, changes: list[Callable[[Element, dict], None]]):
+    # parse the xmp file once, collecting namespaces along the way
+    namespaces = {}
+    root = None
+    for event, data in ElementTree.iterparse(in_filename, events=['start-ns', 'start']):
+        if event == 'start-ns':
+            name, uri = data
+            namespaces[name] = uri
+        elif root is None:
+            root = data
     # register all namespaces
-    namespaces = dict([node for _, node in ElementTree.iterparse(in_filename, events=['start-ns'])])
     for name, uri in namespaces.items():
         ElementTree.register_namespace(name, uri)
-    # parse xmp file
-    tree = ElementTree.parse(in_filename)
-    root = tree.getroot()
     # go through all "changers" which modify the xmp
     for func in changes:
         func(root, namespaces)
@@ -548,10 +677,16 @@ def modify_xmp(in_filename, out_fd: TextIOWrapper, changes: list[Callable[[Eleme
     out_fd.flush()
 
 
+# selector constants so ElementTree's compiled path cache is hit
+# with the identical string on every call
+_XMP_HISTORY_SEQ_PATH = './/darktable:history//rdf:Seq'
+_XMP_BORDERS_LI_PATH = 'rdf:li[@darktable:operation="borders"]'
+
+
 def xmp_remove_borders(xmp_root, namespaces):
-    for parent in xmp_root.findall('.//darktable:history//rdf:Seq', namespaces):
-        for element in parent.findall('rdf:li[@darktable:operation="borders"]', namespaces):
-            key = f'{{{namespaces["darktable"]}}}enabled'
+    key = f'{{{namespaces["darktable"]}}}enabled'
+    for parent in xmp_root.findall(_XMP_HISTORY_SEQ_PATH, namespaces):
+        for element in parent.findall(_XMP_BORDERS_LI_PATH, namespaces):
             if key in element.attrib:
                 element.attrib[key] = '0'
 
@@ -562,16 +697,19 @@ def sanitize_xmp(in_filename, out_fd: TextIOWrapper):
     ])
 
 
+# all raw image file extensions
+# (excluding darktable export extensions, namely tif)
+# https://en.wikipedia.org/wiki/Raw_image_format
+# https://docs.darktable.org/usermanual/4.0/en/special-topics/program-invocation/darktable-cli/
+_RAW_EXTS = frozenset([
+    '3fr', 'ari', 'arw', 'bay', 'braw', 'crw', 'cr2', 'cr3',
+    'cap', 'data', 'dcs', 'dcr', 'dng', 'drf', 'eip', 'erf',
+    'fff', 'gpr', 'iiq', 'k25', 'kdc', 'mdc', 'mef', 'mos',
+    'mrw', 'nef', 'nrw', 'obm', 'orf', 'pef', 'ptx', 'pxn',
+    'r3d', 'raf', 'raw', 'rwl', 'rw2', 'rwz', 'sr2', 'srf',
+    'srw', 'tif', 'x3f'
+]) - frozenset(['tif'])
+
+
 def is_raw_photo_ext(ext: str) -> bool:
-    # all raw image file extensions
-    # (excluding darktable export extensions, namely tif)
-    # https://en.wikipedia.org/wiki/Raw_image_format
-    # https://docs.darktable.org/usermanual/4.0/en/special-topics/program-invocation/darktable-cli/
-    return ext.strip().lstrip('.').lower() in set([
-        '3fr', 'ari', 'arw', 'bay', 'braw', 'crw', 'cr2', 'cr3',
-        'cap', 'data', 'dcs', 'dcr', 'dng', 'drf', 'eip', 'erf',
-        'fff', 'gpr', 'iiq', 'k25', 'kdc', 'mdc', 'mef', 'mos',
-        'mrw', 'nef', 'nrw', 'obm', 'orf', 'pef', 'ptx', 'pxn',
-        'r3d', 'raf', 'raw', 'rwl', 'rw2', 'rwz', 'sr2', 'srf',
-        'srw', 'tif', 'x3f'
-    ]) - set(['tif'])
+    return ext.strip().lstrip('.').lower() in _RAW_EXTS
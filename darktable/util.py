@@ -1,9 +1,9 @@
-import sys
+import os
+import mmap
+import pickle
 import hashlib
 import sqlite3
 
-import simple_cache
-
 
 def fullname(o):
     klass = o.__class__
@@ -14,11 +14,35 @@ def fullname(o):
     ])
 
 
-def filehash(filepath):
-    sha1 = hashlib.sha1()
-    with open(filepath, 'rb') as f:
-        sha1.update(f.read())
-    return sha1.hexdigest()
+# digests of already hashed files, keyed by path,
+# remembered together with the stat signature of the hashed file
+_filehash_cache: dict[str, tuple[int, int, str]] = {}
+
+
+def filehash(filepath, cache=None):
+    # skip hashing entirely when the file is unchanged
+    # since the last call, judged by its mtime and size.
+    # the memo is held in-process and, when a Cache is given,
+    # persisted there too, so repeat runs don't re-hash either.
+    stat = os.stat(filepath)
+    cached = _filehash_cache.get(filepath)
+    if cached is None and cache is not None:
+        cached = cache.load(filepath)
+    if cached is not None and tuple(cached[:2]) == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    # hash the memory-mapped file so the digest reads straight from
+    # the page cache without copying the file into a bytes object.
+    # empty files cannot be mapped, so short-circuit those.
+    if stat.st_size == 0:
+        digest = hashlib.sha1().hexdigest()
+    else:
+        with open(filepath, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                digest = hashlib.sha1(mm).hexdigest()
+    _filehash_cache[filepath] = (stat.st_mtime_ns, stat.st_size, digest)
+    if cache is not None:
+        cache.save(filepath, (stat.st_mtime_ns, stat.st_size, digest))
+    return digest
 
 
 def readonly_sqlite_connection(db_path):
@@ -27,16 +51,61 @@ def readonly_sqlite_connection(db_path):
     return con
 
 
+# one long-lived connection per cache file,
+# shared between all Cache instances that point at the same file
+_cache_connections: dict[str, sqlite3.Connection] = {}
+
+
+def _cache_connection(cache_filepath):
+    con = _cache_connections.get(cache_filepath)
+    if con is None:
+        con = _open_cache_database(cache_filepath)
+        _cache_connections[cache_filepath] = con
+    return con
+
+
+def _open_cache_database(cache_filepath):
+    con = sqlite3.connect(cache_filepath)
+    try:
+        con.execute('PRAGMA journal_mode = WAL')
+    except sqlite3.DatabaseError:
+        # the file predates the sqlite cache backend (a pickle file).
+        # it's only a cache, so discard it and start fresh.
+        con.close()
+        os.remove(cache_filepath)
+        con = sqlite3.connect(cache_filepath)
+        con.execute('PRAGMA journal_mode = WAL')
+    con.execute('PRAGMA synchronous = NORMAL')
+    with con:
+        con.execute("""--sql
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value BLOB
+            );
+        """)
+    return con
+
+
 class Cache:
     def __init__(self, cache_filepath, *, prefix=''):
         self.cache_filepath = cache_filepath
         self.key_prefix = prefix
 
+    @property
+    def _con(self):
+        return _cache_connection(self.cache_filepath)
+
     def save(self, key, value):
-        return simple_cache.save_key(self.cache_filepath, self.key_prefix + key, value, sys.maxsize)
+        with self._con as con:
+            con.execute("""--sql
+                INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?);
+            """, (self.key_prefix + key, pickle.dumps(value)))
 
     def load(self, key):
-        return simple_cache.load_key(self.cache_filepath, self.key_prefix + key)
+        row = self._con.execute("""--sql
+            SELECT value FROM kv WHERE key = ?;
+        """, (self.key_prefix + key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
 
     def store(self, key):
         return self.save(key, True)
@@ -45,37 +114,56 @@ class Cache:
         return self.load(key) != None
 
     def delete(self, key):
-        cache = simple_cache.read_cache(self.cache_filepath)
-        actual_key = self.key_prefix + key
-        if actual_key in cache:
-            del cache[actual_key]
-        simple_cache.write_cache(self.cache_filepath, cache)
+        with self._con as con:
+            con.execute("""--sql
+                DELETE FROM kv WHERE key = ?;
+            """, (self.key_prefix + key,))
 
     def prune(self):
-        cache = simple_cache.read_cache(self.cache_filepath)
-        for key in list(cache.keys()):
-            if key.startswith(self.key_prefix):
-                del cache[key]
-        simple_cache.write_cache(self.cache_filepath, cache)
+        with self._con as con:
+            con.execute("""--sql
+                DELETE FROM kv WHERE substr(key, 1, ?) = ?;
+            """, (len(self.key_prefix), self.key_prefix))
 
     def update(self, dictionary):
-        cache = simple_cache.read_cache(self.cache_filepath)
-        for key, value in dictionary.items():
-            cache[self.key_prefix + key] = (sys.maxsize, value)
-        simple_cache.write_cache(self.cache_filepath, cache)
+        with self._con as con:
+            con.executemany("""--sql
+                INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?);
+            """, [
+                (self.key_prefix + key, pickle.dumps(value))
+                for key, value in dictionary.items()
+            ])
 
     def replace(self, dictionary):
         self.prune()
         self.update(dictionary)
 
     def items(self, *, has_value=None):
-        cache = simple_cache.read_cache(self.cache_filepath)
+        rows = self._con.execute("""--sql
+            SELECT key, value FROM kv WHERE substr(key, 1, ?) = ?;
+        """, (len(self.key_prefix), self.key_prefix)).fetchall()
         return [
             (key.removeprefix(self.key_prefix), value)
-            for key, (_, value) in cache.items()
-            if key.startswith(self.key_prefix)
-            and (has_value is None or value == has_value)
+            for key, value in (
+                (key, pickle.loads(value))
+                for key, value in rows
+            )
+            if has_value is None or value == has_value
         ]
 
     def keys(self, *, has_value=None):
         return [k for k, v in self.items(has_value=has_value)]
+
+
+def cache_save_many(writes):
+    """ Applies multiple (cache, key, value) writes in one transaction.
+        All caches must point at the same cache file.
+    """
+    con = _cache_connection(writes[0][0].cache_filepath)
+    with con:
+        con.executemany("""--sql
+            INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?);
+        """, [
+            (cache.key_prefix + key, pickle.dumps(value))
+            for cache, key, value in writes
+        ])
@@ -1,8 +1,13 @@
+import mmap
 import os
 import re
+import shutil
 import sys
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
 
 from darktable import darktable
 
@@ -16,44 +21,201 @@ XMP_EXT_NAME = 'xmp'
 XMP_EXT = f'.{XMP_EXT_NAME}'
 MIN_RATING_EXCLUDED = 1
 
+_XMP_RATING_RE = re.compile(rb'xmp:Rating="(\d+)"')
 
-def get_xmp_rating(file):
-    _, ext = os.path.splitext(file)
-    if ext != XMP_EXT:
-        file = file + XMP_EXT
-    if not os.path.exists(file):
+# darktable writes its sidecars with fixed namespace prefixes,
+# so both the rating and the color labels have a narrow, regular
+# textual footprint that regexes extract without an xml parse
+_XMP_COLORLABELS_BLOCK_RE = re.compile(
+    rb'<darktable:colorlabels>(.*?)</darktable:colorlabels>', re.DOTALL)
+_XMP_COLORLABEL_RE = re.compile(rb'<rdf:li[^>]*>(\d+)</rdf:li>')
+
+
+# which xmp filenames exist per directory, memoized per process,
+# so existence is answered by one scandir per directory
+# instead of one stat syscall per photo
+_xmp_dir_cache: dict[str, frozenset] = {}
+
+
+def xmp_files_in(directory) -> frozenset:
+    present = _xmp_dir_cache.get(directory)
+    if present is None:
+        try:
+            with os.scandir(directory) as entries:
+                present = frozenset(
+                    entry.name for entry in entries
+                    if entry.name.endswith(XMP_EXT))
+        except FileNotFoundError:
+            present = frozenset()
+        _xmp_dir_cache[directory] = present
+    return present
+
+
+def read_xmp(file):
+    """ Returns the raw contents of an XMP file as a memory-mapped
+        buffer (empty files yield b''), or None if it does not exist.
+    """
+    if os.path.basename(file) not in xmp_files_in(os.path.dirname(file)):
         return None
-    with open(file, 'r') as f:
-        content = f.read()
-        for match in re.findall('xmp:Rating=\"(\\d+)\"', content):
-            return int(match)
-    return None
-
-
-def get_xmp_color_labels(file) -> set[darktable.ColorLabel]:
-    namespaces = dict([node for _, node in ElementTree.iterparse(file, events=['start-ns'])])
-    for name, uri in namespaces.items():
-        ElementTree.register_namespace(name, uri)
-    # parse xmp file
-    tree = ElementTree.parse(file)
-    root = tree.getroot()
-    color_labels = set()
-    for parent in root.findall('.//darktable:colorlabels//rdf:Seq', namespaces):
-        for element in parent.findall('rdf:li', namespaces):
-            color_labels.add(darktable.ColorLabel(int(element.text)))
-    return color_labels
-
-
-def format_color_labels(color_labels: set[darktable.ColorLabel]):
-    items = list(map(lambda c: c.name.lower(),
-                     sorted(list(color_labels), key=lambda c: c.value)))
-    return ','.join(items) if len(items) > 0 else repr([])
-
-
-def format_info(info: dict[str, any]):
+    try:
+        # the regexes search the mapped pages directly, without
+        # copying the file into a bytes object first.
+        # empty files cannot be mapped, so short-circuit those.
+        with open(file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def parse_xmp(content: bytes) -> tuple[int, frozenset[int]]:
+    """ Parses raw XMP contents and returns both its rating
+        (or None if it has none) and its darktable color labels
+        as a set of raw label values.
+    """
+    # the rating is a plain attribute that a regex finds reliably
+    match = _XMP_RATING_RE.search(content)
+    rating = int(match.group(1)) if match else None
+    # the color labels are confined to the colorlabels block,
+    # which two linear scans extract without any xml parsing.
+    # most sidecars have no labels and darktable omits the block
+    # entirely then, which a plain substring scan rules out fastest
+    # (find instead of the in operator, which mmap doesn't support).
+    color_labels = frozenset()
+    if content.find(b'<darktable:colorlabels>') != -1:
+        block = _XMP_COLORLABELS_BLOCK_RE.search(content)
+        if block:
+            color_labels = frozenset(
+                int(value)
+                for value in _XMP_COLORLABEL_RE.findall(block.group(1)))
+    return rating, color_labels
+
+
+def format_color_labels(color_labels: set[int]):
+    # label values only become ColorLabel names here, i.e. at most
+    # once per reported inconsistency instead of once per photo
+    return ','.join(
+        darktable.ColorLabel(value).name.lower()
+        for value in sorted(color_labels)) or '[]'
+
+
+class ResultLog:
+    """ Spools result messages to a temporary file instead of
+        accumulating them in memory, and counts them.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(mode='w+')
+        self.count = 0
+
+    def append(self, message: str):
+        self.file.write(message + '\n')
+        self.count += 1
+
+    def print_all(self):
+        self.file.flush()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, sys.stdout)
+
+
+def format_info(**info):
     return ' '.join(
-        map(lambda v: f'{v[0]}={v[1]}',
-            filter(lambda v: v[1] is not None, list(info.items()))))
+        f'{key}={value}'
+        for key, value in info.items()
+        if value is not None)
+
+
+def check_photo(photo: darktable.Photo, xmp_content: bytes) -> tuple:
+    """ Checks a single photo's xmp contents (None if the file does
+        not exist) against its database state.
+        Returns (checked, no_xmp, no_rating, bad_rating, bad_labels),
+        where checked says whether the photo was significant enough
+        to check at all and the remaining entries are formatted
+        inconsistency messages or None.
+    """
+    database_rating = photo.rating
+    database_color_labels = frozenset(
+        label.value for label in photo.color_labels)
+    # parse each xmp file at most once,
+    # both the skip check and the consistency checks reuse the result
+    xmp_exists = xmp_content is not None
+    xmp_rating = None
+    xmp_color_labels = frozenset()
+    if xmp_exists:
+        xmp_rating, xmp_color_labels = parse_xmp(xmp_content)
+    if database_rating <= MIN_RATING_EXCLUDED and len(database_color_labels) == 0:
+        # Hasn't been rated or marked as significant in the database
+        skip = True
+        if xmp_exists:
+            if xmp_rating is not None and xmp_rating > MIN_RATING_EXCLUDED:
+                # this xmp has a rating that is higher than in the database
+                skip = False
+            if len(xmp_color_labels) > 0:
+                # this xmp has color labels which are not in the database
+                skip = False
+        if skip:
+            return (False, None, None, None, None)
+    no_rating = None
+    bad_rating = None
+    bad_labels = None
+    # does the xmp file exist?
+    photo_filename = os.path.basename(photo.filepath)
+    if not xmp_exists:
+        no_xmp = f'{photo_filename}: no xmp file. ' + format_info(
+            version=photo.version, path=photo.filepath)
+        return (True, no_xmp, None, None, None)
+    xmp_filename = os.path.basename(photo.xmp_path)
+    # does the xmp file have any rating?
+    if xmp_rating is None:
+        no_rating = f'{photo_filename}: no rating in xmp file. ' + format_info(
+            version=photo.version, path=photo.filepath, xmp=xmp_filename,
+            database_rating=database_rating)
+    # does the xmp file contain the correct database rating?
+    if xmp_rating is not None and xmp_rating != database_rating:
+        bad_rating = f'{photo_filename}: inconsistent xmp rating. ' + format_info(
+            version=photo.version, path=photo.filepath, xmp=xmp_filename,
+            database_rating=database_rating, xmp_rating=xmp_rating)
+    # does the xmp file contain the correct color labels?
+    if database_color_labels != xmp_color_labels:
+        bad_labels = f'{photo_filename}: inconsistent xmp color labels. ' + format_info(
+            version=photo.version, path=photo.filepath, xmp=xmp_filename,
+            database_labels=format_color_labels(database_color_labels),
+            xmp_labels=format_color_labels(xmp_color_labels))
+    return (True, None, no_rating, bad_rating, bad_labels)
+
+
+# how many xmp files are read ahead on how many I/O threads
+# while earlier files are still being parsed and compared
+IO_READ_WORKERS = 16
+IO_READ_AHEAD = 32
+
+
+def check_photos(photos: list[darktable.Photo]) -> list[tuple]:
+    """ Checks a batch of photos, reading the xmp files of upcoming
+        photos ahead on I/O threads while the current one is parsed,
+        so disk latency is hidden behind the parse work.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=IO_READ_WORKERS) as io_pool:
+
+        def submit_read(photo):
+            # answered in memory: don't occupy an I/O thread for
+            # sidecars that the directory listing says don't exist
+            directory, filename = os.path.split(photo.xmp_path)
+            if filename not in xmp_files_in(directory):
+                return None
+            return io_pool.submit(read_xmp, photo.xmp_path)
+
+        reads = deque(submit_read(photo) for photo in photos[:IO_READ_AHEAD])
+        for i, photo in enumerate(photos):
+            ahead = i + IO_READ_AHEAD
+            if ahead < len(photos):
+                reads.append(submit_read(photos[ahead]))
+            read = reads.popleft()
+            results.append(check_photo(
+                photo, read.result() if read is not None else None))
+    return results
 
 
 def main():
@@ -65,82 +227,54 @@ def main():
     library = darktable.DarktableLibrary(sys.argv[1])
     photos = library.get_photos()
     count_checked = 0
-    percent_step = 10
-    next_percent = percent_step
-    result_no_xmp = []
-    result_no_xmp_rating = []
-    result_inconsistent_xmp_rating = []
-    result_inconsistent_xmp_labels = []
+    # progress is sampled off the hot loop by a background thread
+    # once a second, the loop itself only increments a counter
+    progress_count = 0
+    progress_done = threading.Event()
+
+    def report_progress():
+        while not progress_done.wait(1.0):
+            print(f'..{100 * progress_count // max(1, len(photos))}%',
+                  end='', file=sys.stderr)
+
+    result_no_xmp = ResultLog()
+    result_no_xmp_rating = ResultLog()
+    result_inconsistent_xmp_rating = ResultLog()
+    result_inconsistent_xmp_labels = ResultLog()
     print('scanning database and xmp files. this could take a while', end='', file=sys.stderr)
-    for i, photo in enumerate(photos):
-        percent = int(100.0 * float(i) / len(photos))
-        if i % 100 == 0:
-            print('.', end='', file=sys.stderr)
-        if percent >= next_percent and percent < 100:
-            print(f'{percent}%', end='', file=sys.stderr)
-            next_percent += percent_step
-        database_rating = photo.rating
-        database_color_labels = photo.color_labels
-        info = {
-            'version': photo.version,
-            'path': photo.filepath,
-            'xmp': None,
-            'database_rating': None,
-            'xmp_rating': None,
-            'database_labels': None,
-            'xmp_labels': None,
-        }
-        if database_rating <= MIN_RATING_EXCLUDED and len(database_color_labels) == 0:
-            # Hasn't been rated or marked as significant in the database
-            skip = True
-            if os.path.exists(photo.xmp_path):
-                rating = get_xmp_rating(photo.xmp_path)
-                if rating is not None and rating > MIN_RATING_EXCLUDED:
-                    # this xmp has a rating that is higher than in the database
-                    skip = False
-                color_labels = get_xmp_color_labels(photo.xmp_path)
-                if len(color_labels) > 0:
-                    # this xmp has color labels which are not in the database
-                    skip = False
-            if skip:
+    progress_thread = threading.Thread(target=report_progress, daemon=True)
+    progress_thread.start()
+    # every photo is checked against an independent sidecar file,
+    # so the checks parallelize over all cores in batches
+    chunks = [photos[i:i + 64] for i in range(0, len(photos), 64)]
+    with ProcessPoolExecutor() as pool:
+        results = chain.from_iterable(pool.map(check_photos, chunks))
+        for result in results:
+            progress_count += 1
+            checked, no_xmp, no_rating, bad_rating, bad_labels = result
+            if not checked:
                 continue
-        count_checked += 1
-        # does the xmp file exist?
-        photo_filename = os.path.basename(photo.filepath)
-        if not os.path.exists(photo.xmp_path):
-            result_no_xmp.append(f'{photo_filename}: no xmp file. {format_info(info)}')
-            continue
-        info['xmp'] = os.path.basename(photo.xmp_path)
-        # does the xmp file have any rating?
-        xmp_rating = get_xmp_rating(photo.xmp_path)
-        if xmp_rating is None:
-            copy = dict(info)
-            copy['database_rating'] = database_rating
-            result_no_xmp_rating.append(f'{photo_filename}: no rating in xmp file. {format_info(copy)}')
-        # does the xmp file contain the correct database rating?
-        if xmp_rating is not None and xmp_rating != database_rating:
-            copy = dict(info)
-            copy['database_rating'] = database_rating
-            copy['xmp_rating'] = xmp_rating
-            result_inconsistent_xmp_rating.append(f'{photo_filename}: inconsistent xmp rating. {format_info(copy)}')
-        # does the xmp file contain the correct color labels?
-        xmp_color_labels = get_xmp_color_labels(photo.xmp_path)
-        if database_color_labels != xmp_color_labels:
-            copy = dict(info)
-            copy['database_labels'] = format_color_labels(database_color_labels)
-            copy['xmp_labels'] = format_color_labels(xmp_color_labels)
-            result_inconsistent_xmp_labels.append(f'{photo_filename}: inconsistent xmp color labels. {format_info(copy)}')
-
-    print('100%', file=sys.stderr)
+            count_checked += 1
+            if no_xmp is not None:
+                result_no_xmp.append(no_xmp)
+            if no_rating is not None:
+                result_no_xmp_rating.append(no_rating)
+            if bad_rating is not None:
+                result_inconsistent_xmp_rating.append(bad_rating)
+            if bad_labels is not None:
+                result_inconsistent_xmp_labels.append(bad_labels)
+
+    progress_done.set()
+    progress_thread.join()
+    print('..100%', file=sys.stderr)
     print(file=sys.stderr)
 
-    def print_result(label: str, result: list[str]):
-        if len(result) > 0:
-            print(f'{label} ({len(result)}):')
-            for m in result:
-                print(m)
+    def print_result(label: str, result: ResultLog):
+        if result.count > 0:
+            print(f'{label} ({result.count}):')
+            result.print_all()
             print()
-        return len(result)
+        return result.count
 
     n = 0
     n += print_result('no xmp files', result_no_xmp)
@@ -150,14 +284,14 @@ def main():
 
     print(f'{len(photos)} total photos in library')
     print(f'{count_checked} photos checked that either have a rating above {MIN_RATING_EXCLUDED} or color labels in either the database or the xmp file')
-    if len(result_no_xmp) > 0:
-        print(f'WARN {len(result_no_xmp)} photos have no xmp file')
-    if len(result_no_xmp_rating) > 0:
-        print(f'WARN {len(result_no_xmp_rating)} photos have no rating in their xmp file')
-    if len(result_inconsistent_xmp_rating) > 0:
-        print(f'WARN {len(result_inconsistent_xmp_rating)} photos have an xmp rating that is different from their database rating')
-    if len(result_inconsistent_xmp_labels) > 0:
-        print(f'WARN {len(result_inconsistent_xmp_labels)} photos have color labels that are inconsistent with their database color labels')
+    if result_no_xmp.count > 0:
+        print(f'WARN {result_no_xmp.count} photos have no xmp file')
+    if result_no_xmp_rating.count > 0:
+        print(f'WARN {result_no_xmp_rating.count} photos have no rating in their xmp file')
+    if result_inconsistent_xmp_rating.count > 0:
+        print(f'WARN {result_inconsistent_xmp_rating.count} photos have an xmp rating that is different from their database rating')
+    if result_inconsistent_xmp_labels.count > 0:
+        print(f'WARN {result_inconsistent_xmp_labels.count} photos have color labels that are inconsistent with their database color labels')
     if n == 0:
         print(f'GOOD your database and xmp files look consistent!')
     else: